@@ -10,6 +10,7 @@ echo Press Ctrl+C to stop the server
 echo ========================================
 echo.
 
+python migrate.py
 uvicorn main:app --reload --host 0.0.0.0 --port 8000
 
 pause
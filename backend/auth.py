@@ -1,13 +1,17 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import NamedTuple, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import get_read_db, replica_router, run_db, session_scope
+from menu_changes import watch_changes
+from models import Client, ClientChangeCounter
+import os
 import secrets
 import string
+import threading
+import time
 
 
 # Security configuration
@@ -16,12 +20,68 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 30
 
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Bearer token scheme
 security = HTTPBearer()
 
+# Authenticated client cache: how long a client record is trusted before it
+# is re-read, and how many tokens / clients each worker remembers
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+# Seconds between checks of the client change counter, which a database
+# trigger bumps on any client update or delete; 0 leaves it to AUTH_CACHE_TTL
+AUTH_CACHE_POLL_INTERVAL = float(os.getenv("AUTH_CACHE_POLL_INTERVAL", "2"))
+
+
+class CurrentClient(NamedTuple):
+    """Read-only copy of the Client columns needed after authentication"""
+    id: int
+    client_id: str
+    email: str
+    name: str
+    is_active: bool
+    created_at: datetime
+
+
+class _TTLCache:
+    """Bounded LRU mapping whose entries each carry an expiry timestamp"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by clear(), so a load that started before it is not cached
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at: float):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+
+# token -> decoded payload, kept until the token expires
+_token_cache = _TTLCache(AUTH_CACHE_MAX_ENTRIES)
+# client_id -> CurrentClient, kept for AUTH_CACHE_TTL seconds
+_client_cache = _TTLCache(AUTH_CACHE_MAX_ENTRIES)
+
 def generate_client_id() -> str:
     """Generate a unique client ID"""
     random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(12))
@@ -32,14 +92,6 @@ def generate_client_key() -> str:
     random_part = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
     return f"CK_{random_part}"
 
-def verify_client_key(plain_key: str, hashed_key: str) -> bool:
-    """Verify a client key against its hash"""
-    return pwd_context.verify(plain_key, hashed_key)
-
-def get_client_key_hash(client_key: str) -> str:
-    """Hash a client key"""
-    return pwd_context.hash(client_key)
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -49,53 +101,96 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
     
     to_encode.update({"exp": expire})
+    # Imported on first use: jose (and its crypto backends) is slow to import
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def decode_access_token(token: str):
     """Decode and validate a JWT token"""
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
         return None
 
-def get_current_client(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+def _decode_access_token_cached(token: str):
+    """decode_access_token, memoized until the token's own expiry"""
+    payload = _token_cache.get(token)
+    if payload is None:
+        payload = decode_access_token(token)
+        if payload is not None and AUTH_CACHE_TTL > 0:
+            _token_cache.set(token, payload, payload.get("exp", time.time() + AUTH_CACHE_TTL))
+    return payload
+
+# Last client change counter value this worker has seen
+_client_version = -1
+
+def clients_changed(version: int):
+    """Drop every cached client record once the client change counter moves"""
+    global _client_version
+    previous, _client_version = _client_version, version
+    if previous >= 0:
+        # The re-read must not come from a replica that has not seen the change
+        replica_router.note_write()
+    _client_cache.clear()
+
+async def watch_client_changes():
+    """Poll the client change counter, so changes made anywhere reach this worker's cache"""
+    await watch_changes(clients_changed, lambda: _client_version, ClientChangeCounter, AUTH_CACHE_POLL_INTERVAL)
+
+def _load_current_client(db: Session, client_id: str):
+    client = db.query(Client).filter(Client.client_id == client_id).first()
+    if client is None:
+        return None
+    return CurrentClient(
+        id=client.id,
+        client_id=client.client_id,
+        email=client.email,
+        name=client.name,
+        is_active=client.is_active,
+        created_at=client.created_at,
+    )
+
+async def get_current_client(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db=Depends(get_read_db)
 ):
     """Dependency to get the current authenticated client"""
-    from models import Client
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
     
-    db = SessionLocal()
+    token = credentials.credentials
+    payload = _decode_access_token_cached(token)
     
-    try:
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-        
-        token = credentials.credentials
-        payload = decode_access_token(token)
-        
-        if payload is None:
-            raise credentials_exception
-        
-        client_id: str = payload.get("sub")
-        if client_id is None:
-            raise credentials_exception
-        
-        client = db.query(Client).filter(Client.client_id == client_id).first()
+    if payload is None:
+        raise credentials_exception
+    
+    client_id: str = payload.get("sub")
+    if client_id is None:
+        raise credentials_exception
+    
+    client = _client_cache.get(client_id)
+    if client is None:
+        generation = _client_cache.generation
+        client = await run_db(db, _load_current_client, client_id)
+        if client is None and db.info.get("replica") is not None:
+            # A client registered moments ago may not have reached the replica
+            async with session_scope() as primary:
+                client = await run_db(primary, _load_current_client, client_id)
         if client is None:
             raise credentials_exception
-        
-        if not client.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Client account is inactive"
-            )
-        
-        return client
-    finally:
-        db.close()
-
+        if AUTH_CACHE_TTL > 0 and _client_cache.generation == generation:
+            _client_cache.set(client_id, client, time.time() + AUTH_CACHE_TTL)
+    
+    if not client.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Client account is inactive"
+        )
+    
+    return client
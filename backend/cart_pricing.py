@@ -0,0 +1,87 @@
+"""
+Server-side cart pricing.
+
+Prices are held as integer cents in a table tied to the menu cache version, so
+quoting a cart is dict lookups and integer sums. Ids the table has not seen
+yet are fetched together in one query and remembered until the next menu
+write (including other workers' writes, once the change poller sees them).
+"""
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy.orm import Session
+from menu_cache import menu_cache, MENU_CACHE_TTL
+from models import MenuItem
+
+_CENT = Decimal("0.01")
+
+
+def to_cents(price: float) -> int:
+    """Convert a stored float price to exact integer cents"""
+    return int((Decimal(str(price)) / _CENT).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents) * _CENT
+
+
+class PriceTable:
+    def __init__(self, version: int):
+        self.version = version
+        self.built_at = time.monotonic()
+        # item id -> (name, price in cents), or None for ids that do not exist
+        self.prices = {}
+
+    def is_current(self) -> bool:
+        return self.version == menu_cache.version and time.monotonic() - self.built_at < MENU_CACHE_TTL
+
+    def unknown(self, ids):
+        return [item_id for item_id in ids if item_id not in self.prices]
+
+    def load(self, db: Session, ids):
+        """Fetch prices for ids in a single IN query"""
+        rows = db.query(MenuItem.id, MenuItem.name, MenuItem.price).filter(MenuItem.id.in_(ids)).all()
+        found = {row.id: (row.name, to_cents(row.price)) for row in rows}
+        self.prices.update({item_id: found.get(item_id) for item_id in ids})
+
+
+_price_table = None
+
+
+def current_price_table() -> PriceTable:
+    global _price_table
+    table = _price_table
+    if table is None or not table.is_current():
+        table = PriceTable(menu_cache.version)
+        _price_table = table
+    return table
+
+
+def quote_cart(table: PriceTable, lines) -> dict:
+    """Price (item_id, quantity) pairs against a fully loaded table"""
+    quoted = []
+    missing = []
+    subtotal = 0
+    item_count = 0
+    prices = table.prices
+    for item_id, quantity in lines:
+        entry = prices.get(item_id)
+        if entry is None:
+            missing.append(item_id)
+            continue
+        name, cents = entry
+        line_cents = cents * quantity
+        subtotal += line_cents
+        item_count += quantity
+        quoted.append({
+            "item_id": item_id,
+            "name": name,
+            "quantity": quantity,
+            "unit_price": from_cents(cents),
+            "line_total": from_cents(line_cents),
+        })
+    return {
+        "lines": quoted,
+        "subtotal": from_cents(subtotal),
+        "item_count": item_count,
+        "missing": missing,
+    }
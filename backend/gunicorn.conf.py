@@ -0,0 +1,62 @@
+"""
+Gunicorn settings for production: uvicorn workers forked from a preloaded app.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Every setting can be overridden with an environment variable (WEB_CONCURRENCY,
+PORT, GUNICORN_*) or a command-line flag.
+"""
+import os
+
+
+def _cpu_count() -> int:
+    # Respect CPU affinity / container cpusets where the platform exposes them
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+worker_class = "uvicorn.workers.UvicornWorker"
+# Async workers each keep a core busy, so one per core rather than 2n+1
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or _cpu_count()
+
+# Import the app (and open the pools) once in the master; workers fork from it
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# Longer than the load balancer's idle timeout, so it never reuses a
+# connection the worker has just closed
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Recycle workers after this many requests (0 never does)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+# Heartbeat files on tmpfs, so a slow disk cannot make workers look hung
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    from database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+    server.log.info(
+        "%d workers, up to %d database connections each (%d total)",
+        server.num_workers, DB_POOL_SIZE + DB_MAX_OVERFLOW, server.num_workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW),
+    )
+
+
+def post_fork(server, worker):
+    # Connections the preloaded app opened belong to the master. Forget them
+    # in the worker without closing the master's sockets, so each worker
+    # opens its own.
+    from database import sync_engines
+
+    for bind in sync_engines():
+        bind.dispose(close=False)
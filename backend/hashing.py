@@ -0,0 +1,191 @@
+"""
+Client key hashing off the request workers.
+
+bcrypt deliberately burns ~200ms of CPU per call. Running it inline (or on the
+threadpool) holds the GIL and starves every other request on the worker, so
+hashing and verification go to a small dedicated process pool instead. When
+more than HASH_POOL_MAX_QUEUE calls are already waiting, new ones fail fast
+with 503 rather than piling up behind a login burst. A hashing process that
+dies (OOM kill, segfault) breaks the whole executor, so a broken pool is
+thrown away and the call retried once on a fresh one.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+# Worker processes per app worker; 0 runs bcrypt on the threadpool instead
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", "2"))
+# Calls allowed to wait for a free hashing process before we answer 503
+HASH_POOL_MAX_QUEUE = int(os.getenv("HASH_POOL_MAX_QUEUE", "32"))
+
+# Password hashing; passlib is imported on first use to keep worker startup fast
+_pwd_context = None
+
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
+
+def _timed_verify(plain_key: str, hashed_key: str):
+    started = time.time()
+    return get_pwd_context().verify(plain_key, hashed_key), started, time.time()
+
+
+def _timed_hash(client_key: str):
+    started = time.time()
+    return get_pwd_context().hash(client_key), started, time.time()
+
+
+class HashPoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.pool_restarts = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+
+    def record(self, submitted: float, started: float, finished: float):
+        with self._lock:
+            self.completed += 1
+            hashed = finished - started
+            waited = max(started - submitted, 0.0)
+            self.hash_seconds_total += hashed
+            self.hash_seconds_max = max(self.hash_seconds_max, hashed)
+            self.queue_seconds_total += waited
+            self.queue_seconds_max = max(self.queue_seconds_max, waited)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            completed = self.completed
+            return {
+                "workers": HASH_POOL_WORKERS,
+                "max_queue": HASH_POOL_MAX_QUEUE,
+                "in_flight": self.in_flight,
+                "completed": completed,
+                "rejected": self.rejected,
+                "pool_restarts": self.pool_restarts,
+                "hash_seconds_avg": round(self.hash_seconds_total / completed, 6) if completed else 0.0,
+                "hash_seconds_max": round(self.hash_seconds_max, 6),
+                "queue_seconds_avg": round(self.queue_seconds_total / completed, 6) if completed else 0.0,
+                "queue_seconds_max": round(self.queue_seconds_max, 6),
+            }
+
+
+hash_pool_stats = HashPoolStats()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn, not fork: the parent runs threads and holds DB sockets
+                _pool = ProcessPoolExecutor(
+                    max_workers=HASH_POOL_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next _get_pool() starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            with hash_pool_stats._lock:
+                hash_pool_stats.pool_restarts += 1
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _run_in_pool(fn, *args):
+    """fn(*args) in the hashing pool, retried once if a worker process died"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = _get_pool()
+        try:
+            return await loop.run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if attempt:
+                raise
+
+
+# A 4-round bcrypt hash of "warmup": cheap to check, still loads the backend
+_WARMUP_HASH = "$2b$04$v7RWJzQKUrxknwkiSFTho.6NKp4wA1qUv4.dM2cKX2osZpYTeDQs."
+
+
+async def warm_up_hashing():
+    """Start every hashing process and load the bcrypt backend in each"""
+    if HASH_POOL_WORKERS > 0:
+        # Processes are spawned on demand, one per task nobody is idle for
+        await asyncio.gather(*[
+            _run_in_pool(_timed_verify, "warmup", _WARMUP_HASH)
+            for _ in range(HASH_POOL_WORKERS)
+        ])
+    else:
+        await run_in_threadpool(_timed_verify, "warmup", _WARMUP_HASH)
+
+
+def shutdown_hash_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def _run(fn, *args):
+    with hash_pool_stats._lock:
+        if hash_pool_stats.in_flight >= max(HASH_POOL_WORKERS, 1) + HASH_POOL_MAX_QUEUE:
+            hash_pool_stats.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        hash_pool_stats.in_flight += 1
+    submitted = time.time()
+    try:
+        if HASH_POOL_WORKERS > 0:
+            result, started, finished = await _run_in_pool(fn, *args)
+        else:
+            result, started, finished = await run_in_threadpool(fn, *args)
+    except BrokenProcessPool:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is restarting, please retry",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        with hash_pool_stats._lock:
+            hash_pool_stats.in_flight -= 1
+    hash_pool_stats.record(submitted, started, finished)
+    return result
+
+
+async def verify_client_key_async(plain_key: str, hashed_key: str) -> bool:
+    """Verify a client key against its hash in the hashing pool"""
+    return await _run(_timed_verify, plain_key, hashed_key)
+
+
+async def get_client_key_hash_async(client_key: str) -> str:
+    """Hash a client key in the hashing pool"""
+    return await _run(_timed_hash, client_key)
@@ -1,25 +1,143 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Response
+import time
+
+# Cold start is reported from here: import, then lifespan startup
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Depends, Query, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-from models import Base, MenuItem, Client
-from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import case, delete, insert, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
+from database import (
+    engine, get_db, get_read_db, run_db, pool_status, read_session_scope, replica_router,
+    session_scope, sync_engines, warm_pool
+)
+from models import MenuItem, Client
+from typing import List, Literal, Optional
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager, suppress
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import logging
 import os
+from schemas import (
+    MenuItemCreate,
+    MenuItemResponse,
+    MenuBatchRequest,
+    MenuBatchResponse,
+    MenuChangesResponse,
+    MenuItemsLookupResponse,
+    MENU_BATCH_MAX_ITEMS,
+    CartQuoteRequest,
+    CartQuoteResponse,
+    ClientRegister,
+    ClientRegisterResponse,
+    ClientLogin,
+    TokenResponse,
+    ClientInfoResponse
+)
+from cart_pricing import current_price_table, quote_cart
+from metrics import MetricsMiddleware, instrument_engine, render_metrics, startup_timings
+from migrate import SCHEMA_CHECK, startup_schema_check
+from profiler import QUERY_PROFILER, ProfilerMiddleware, profile_engine, recent_profiles
+from menu_changes import (
+    MENU_CHANGES_POLL_INTERVAL,
+    next_change_version,
+    record_deletions,
+    load_changes,
+    watch_changes
+)
+from menu_events import menu_broadcaster, event_stream
+from menu_cache import menu_cache, etag_matches, choose_encoding, dump_json
+from menu_bulk import MenuImport, detect_format, iter_body_lines, stream_export, FORMATS
+from menu_search import (
+    search_menu, search_index_stale, search_index_version, load_search_rows, install_search_index,
+    SearchTimeout, MENU_SEARCH_TIMEOUT_MS
+)
+from single_flight import read_flights
+from pagination import clamp_page_size, cursor_matches, encode_cursor, decode_cursor, page_headers
 from auth import (
     generate_client_id, 
     generate_client_key, 
-    get_client_key_hash, 
-    verify_client_key,
     create_access_token,
-    get_current_client
+    get_current_client,
+    CurrentClient,
+    AUTH_CACHE_POLL_INTERVAL,
+    watch_client_changes
 )
+from hashing import (
+    get_client_key_hash_async,
+    verify_client_key_async,
+    hash_pool_stats,
+    shutdown_hash_pool,
+    warm_up_hashing
+)
+from warmup import WARMUP, WARMUP_CONNECTIONS, run_warmup, warmup_state
 
+logger = logging.getLogger("uvicorn.error")
 
-Base.metadata.create_all(bind=engine)
+# The schema is managed by migrate.py, not at import time
+for bind in sync_engines():
+    instrument_engine(bind)
+    if QUERY_PROFILER:
+        profile_engine(bind)
 
-app = FastAPI()
+async def _warm_queries():
+    """Compile and run the menu page and login queries once"""
+    async with session_scope() as db:
+        await run_db(db, _load_menu_page, (None, None, None, None), "id", None, 0, 100)
+        await run_db(db, _find_client, Client.client_id == "")
+
+async def _check_schema():
+    """Run the SCHEMA_CHECK step and log what it finds"""
+    # A database that is briefly down must not hold up or crash-loop the worker
+    try:
+        for problem in await run_in_threadpool(startup_schema_check):
+            logger.warning("Schema check: %s (run `python migrate.py`)", problem)
+    except Exception as exc:
+        logger.warning("Schema check skipped: %s", str(exc).splitlines()[0])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    watcher = None
+    if MENU_CHANGES_POLL_INTERVAL > 0:
+        # Picks up menu writes made by other workers
+        watcher = asyncio.create_task(
+            watch_changes(_remote_menu_changed, lambda: menu_broadcaster.version)
+        )
+    client_watcher = None
+    if AUTH_CACHE_POLL_INTERVAL > 0:
+        # Drops cached clients changed by other workers, scripts or plain SQL
+        client_watcher = asyncio.create_task(watch_client_changes())
+    steps = []
+    if SCHEMA_CHECK in ("create", "verify"):
+        steps.append(("schema", _check_schema))
+    if WARMUP:
+        steps += [
+            ("connections", lambda: warm_pool(WARMUP_CONNECTIONS)),
+            ("queries", _warm_queries),
+            ("hashing", warm_up_hashing),
+        ]
+    warmer = None
+    if steps:
+        # In the background, so /ready can answer 503 meanwhile
+        warmer = asyncio.create_task(run_warmup(steps))
+    startup_timings["startup"] = time.perf_counter() - started
+    logger.info(
+        "Cold start: import %.0f ms, startup %.0f ms",
+        startup_timings["import"] * 1000, startup_timings["startup"] * 1000
+    )
+    yield
+    for task in (watcher, client_watcher, warmer):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    shutdown_hash_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -39,100 +157,86 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cross-origin JS can only read the pagination headers if they are exposed
+    expose_headers=["X-Next-Cursor", "Link"],
 )
 
-# Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# Pydantic models
-class MenuItemBase(BaseModel):
-    name: str
-    description: str
-    price: float
-    category: str
-    image: Optional[str] = None
-    popular: bool = False
-
-class MenuItemCreate(MenuItemBase):
-    pass
-
-class MenuItemResponse(MenuItemBase):
-    id: int
-    created_at: datetime
-    
-    model_config = ConfigDict(from_attributes=True)
-
-# Authentication Pydantic models
-class ClientRegister(BaseModel):
-    email: str
-    name: str
-
-class ClientRegisterResponse(BaseModel):
-    client_id: str
-    client_key: str
-    email: str
-    name: str
-    message: str
-
-class ClientLogin(BaseModel):
-    client_id: str
-    client_key: str
-
-class TokenResponse(BaseModel):
-    access_token: str
-    token_type: str
-
-class ClientInfoResponse(BaseModel):
-    client_id: str
-    email: str
-    name: str
-    is_active: bool
-    created_at: datetime
-    
-    model_config = ConfigDict(from_attributes=True)
+if QUERY_PROFILER:
+    app.add_middleware(ProfilerMiddleware)
 
+# Outermost, so latency includes the other middleware
+app.add_middleware(MetricsMiddleware)
 
 # Routes
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to the Menu API"}
 
+@app.get("/ready")
+async def readiness():
+    """200 once this worker has warmed up, 503 until then (for load balancer health checks)"""
+    return JSONResponse(warmup_state.snapshot(), status_code=200 if warmup_state.ready else 503)
+
 # ============ AUTHENTICATION ENDPOINTS ============
 
+def _find_client(db: Session, *criteria):
+    return db.query(Client).filter(*criteria).first()
+
+def _insert_client(db: Session, values: dict) -> bool:
+    """Insert a client in one statement; False if the email is already taken"""
+    try:
+        db.execute(insert(Client).values(**values))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        # Only look the email up on this rare path, not before every insert
+        if _find_client(db, Client.email == values["email"]) is not None:
+            return False
+        raise
+    return True
+
+def _list_clients(db: Session, after_id: Optional[int], limit: int):
+    query = db.query(Client).options(
+        load_only(Client.id, Client.client_id, Client.email, Client.name, Client.is_active, Client.created_at)
+    )
+    if after_id is not None:
+        query = query.filter(Client.id > after_id)
+    # One extra row tells us whether there is a next page
+    clients = query.order_by(Client.id).limit(limit + 1).all()
+    return [ClientInfoResponse.model_validate(client).model_dump() | {"id": client.id} for client in clients]
+
+def _cursor_id(cursor: Optional[str]) -> Optional[int]:
+    values = decode_cursor(cursor)
+    if values is None:
+        return None
+    if not cursor_matches(values, (int,)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values[0]
+
 @app.post("/api/auth/register", response_model=ClientRegisterResponse, status_code=status.HTTP_201_CREATED)
-def register_client(client_data: ClientRegister, db: Session = Depends(get_db)):
+async def register_client(client_data: ClientRegister, db=Depends(get_db)):
     """Register a new client and generate credentials"""
     
-    # Check if email already exists
-    existing_client = db.query(Client).filter(Client.email == client_data.email).first()
-    if existing_client:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
     # Generate credentials
     client_id = generate_client_id()
     client_key = generate_client_key()
-    client_key_hash = get_client_key_hash(client_key)
+    client_key_hash = await get_client_key_hash_async(client_key)
     
-    # Create new client
-    new_client = Client(
-        client_id=client_id,
-        client_key_hash=client_key_hash,
-        email=client_data.email,
-        name=client_data.name,
-        is_active=True
-    )
+    # Create new client; the unique email constraint catches duplicates
+    new_client = {
+        "client_id": client_id,
+        "client_key_hash": client_key_hash,
+        "email": client_data.email,
+        "name": client_data.name,
+        "is_active": True,
+        "created_at": datetime.utcnow(),
+    }
     
-    db.add(new_client)
-    db.commit()
-    db.refresh(new_client)
+    if not await run_db(db, _insert_client, new_client):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
     return {
         "client_id": client_id,
@@ -143,11 +247,11 @@ def register_client(client_data: ClientRegister, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/auth/login", response_model=TokenResponse)
-def login_client(credentials: ClientLogin, db: Session = Depends(get_db)):
+async def login_client(credentials: ClientLogin, db=Depends(get_db)):
     """Login with client_id and client_key to get access token"""
     
     # Find client by client_id
-    client = db.query(Client).filter(Client.client_id == credentials.client_id).first()
+    client = await run_db(db, _find_client, Client.client_id == credentials.client_id)
     
     if not client:
         raise HTTPException(
@@ -156,7 +260,7 @@ def login_client(credentials: ClientLogin, db: Session = Depends(get_db)):
         )
     
     # Verify client_key
-    if not verify_client_key(credentials.client_key, client.client_key_hash):
+    if not await verify_client_key_async(credentials.client_key, client.client_key_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid client_id or client_key"
@@ -178,104 +282,481 @@ def login_client(credentials: ClientLogin, db: Session = Depends(get_db)):
     }
 
 @app.get("/api/auth/client-info", response_model=ClientInfoResponse)
-def get_client_info(current_client: Client = Depends(get_current_client)):
+async def get_client_info(current_client: CurrentClient = Depends(get_current_client)):
     """Get current authenticated client information"""
     return current_client
 
 
 @app.get("/api/auth/clients", response_model=List[ClientInfoResponse])
-def list_all_clients(db: Session = Depends(get_db)):
-    """List all registered clients (admin endpoint)"""
-    clients = db.query(Client).all()
+async def list_all_clients(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    db=Depends(get_read_db)
+):
+    """List registered clients one page at a time (admin endpoint)"""
+    limit = clamp_page_size(limit)
+    clients = await run_db(db, _list_clients, _cursor_id(cursor), limit)
+    next_cursor = None
+    if len(clients) > limit:
+        clients = clients[:limit]
+        next_cursor = encode_cursor([clients[-1]["id"]])
+    response.headers.update(page_headers(request.url, next_cursor))
     return clients
 
+# ============ INTERNAL ENDPOINTS ============
+
+@app.get("/api/internal/pool")
+async def get_pool_status():
+    """Connection pool usage for this worker process"""
+    return pool_status()
+
+@app.get("/api/internal/hashing")
+async def get_hashing_status():
+    """Client key hashing pool usage for this worker process"""
+    return hash_pool_stats.snapshot()
+
+@app.get("/api/internal/profiler")
+async def get_query_profiles(flagged: bool = False):
+    """Recent per-request SQL profiles (QUERY_PROFILER), newest first"""
+    return {"enabled": QUERY_PROFILER, "profiles": recent_profiles(flagged)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request, query, pool, hashing and read coalescing metrics for this worker, in Prometheus text format"""
+    return PlainTextResponse(
+        render_metrics(pool_status(), hash_pool_stats.snapshot(), read_flights.snapshot()),
+        media_type="text/plain; version=0.0.4"
+    )
+
 # ============ MENU ENDPOINTS ============
 
+def _menu_changed(event_type: str, version: int, ids=()):
+    """Drop cached menu reads and tell live subscribers what changed"""
+    menu_cache.invalidate()
+    menu_broadcaster.publish(event_type, version, ids)
+
+def _remote_menu_changed(version: int):
+    # Another worker's write may not have reached the replicas yet
+    replica_router.note_write()
+    _menu_changed("changed", version)
+
+def _serialize_menu_item(item: MenuItem) -> dict:
+    return MenuItemResponse.model_validate(item).model_dump(mode="json")
+
+async def _fill_shared(key, load):
+    """Fill a cache miss once for every concurrent request with the same key.
+
+    load(db, version) runs in its own read session, so no caller's request
+    (or disconnect) owns the query the others are waiting on.
+    """
+    version = menu_cache.version
+
+    async def fill():
+        async with read_session_scope() as db:
+            return await load(db, version)
+
+    return await read_flights.do((key, version), fill)
+
+def _start_index_rebuild() -> asyncio.Task:
+    """Start (or join) the rebuild of the in-process search index"""
+    async def rebuild():
+        version = menu_cache.version
+        async with read_session_scope() as db:
+            rows = await run_db(db, load_search_rows)
+        # Off the event loop, so in-flight writes can still commit meanwhile
+        await run_in_threadpool(install_search_index, version, rows, _serialize_menu_item)
+
+    # One rebuild at a time whatever the version: overlapping full scans hold
+    # off writers (on SQLite) and each other. A write that lands meanwhile
+    # leaves the index stale, so the next search starts another.
+    return read_flights.start(("search-index",), rebuild)
+
+def _cached_response(request: Request, entry):
+    """Answer from a cache entry's pre-encoded body, honouring If-None-Match"""
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    body, etag = entry.encoded(encoding)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if body is not entry.body:
+        headers["Content-Encoding"] = encoding
+    headers.update(entry.headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# sort name -> (keyset columns, descending)
+_MENU_SORTS = {
+    "id": ((MenuItem.id,), False),
+    "price": ((MenuItem.price, MenuItem.id), False),
+    "-price": ((MenuItem.price, MenuItem.id), True),
+    "name": ((MenuItem.name, MenuItem.id), False),
+}
+
+def _menu_cursor(cursor: Optional[str], sort: str):
+    values = decode_cursor(cursor)
+    if values is None:
+        return None
+    columns, _ = _MENU_SORTS[sort]
+    if not cursor_matches(values, [column.type.python_type for column in columns]):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+def _load_menu_page(db: Session, filters: tuple, sort: str, after: Optional[tuple], skip: int, limit: int):
+    category, popular, min_price, max_price = filters
+    query = db.query(MenuItem)
+    if category is not None:
+        query = query.filter(MenuItem.category == category)
+    if popular is not None:
+        query = query.filter(MenuItem.popular == popular)
+    if min_price is not None:
+        query = query.filter(MenuItem.price >= min_price)
+    if max_price is not None:
+        query = query.filter(MenuItem.price <= max_price)
+    columns, descending = _MENU_SORTS[sort]
+    if after is not None:
+        key = tuple_(*columns) if len(columns) > 1 else columns[0]
+        bound = tuple_(*after) if len(columns) > 1 else after[0]
+        query = query.filter(key < bound if descending else key > bound)
+    query = query.order_by(*[column.desc() if descending else column for column in columns])
+    if skip:
+        query = query.offset(skip)
+    # One extra row tells us whether there is a next page
+    items = query.limit(limit + 1).all()
+    return [_serialize_menu_item(item) for item in items]
+
+def _load_menu_items(db: Session, ids: List[int]):
+    items = db.query(MenuItem).filter(MenuItem.id.in_(ids)).all()
+    return [_serialize_menu_item(item) for item in items]
+
+def _load_menu_item(db: Session, item_id: int):
+    db_item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
+    return None if db_item is None else _serialize_menu_item(db_item)
+
+# Writes are single INSERT/UPDATE/DELETE ... RETURNING statements: the row
+# comes back with the write, so there is no SELECT before or refresh after.
+# Each one first claims a change version and returns it with its result.
+
+def _insert_menu_item(db: Session, data: dict):
+    version = next_change_version(db)
+    statement = insert(MenuItem).values(**data, version=version).returning(MenuItem)
+    db_item = _serialize_menu_item(db.scalars(statement).one())
+    db.commit()
+    
+    return db_item, version
+
+def _update_menu_item(db: Session, item_id: int, update_data: dict):
+    version = next_change_version(db)
+    statement = update(MenuItem).where(MenuItem.id == item_id).values(**update_data, version=version).returning(MenuItem)
+    db_item = db.scalars(statement, execution_options={"synchronize_session": False}).first()
+    
+    # No row came back: the item does not exist
+    if db_item is None:
+        db.rollback()
+        return None, None
+    
+    db_item = _serialize_menu_item(db_item)
+    db.commit()
+    
+    return db_item, version
+
+def _delete_menu_item(db: Session, item_id: int):
+    version = next_change_version(db)
+    result = db.execute(
+        delete(MenuItem).where(MenuItem.id == item_id),
+        execution_options={"synchronize_session": False}
+    )
+    
+    # No row affected: the item does not exist
+    if result.rowcount == 0:
+        db.rollback()
+        return None
+    
+    record_deletions(db, [item_id], version)
+    db.commit()
+    return version
+
+def _apply_menu_batch(db: Session, updates: List[dict], deletes: List[int]):
+    """Apply a batch of patches and deletes as set-based statements in one transaction"""
+    if not updates and not deletes:
+        # Nothing to change: claiming a version would flush every worker's cache
+        return {"updated": [], "deleted": []}, None
+    version = next_change_version(db)
+    updated = []
+    if updates:
+        ids = [patch["id"] for patch in updates]
+        columns = {column for patch in updates for column in patch if column != "id"}
+        if columns:
+            # One UPDATE: each column becomes CASE id WHEN ... THEN ... ELSE column END
+            values = {
+                column: case(
+                    {patch["id"]: patch[column] for patch in updates if column in patch},
+                    value=MenuItem.id,
+                    else_=getattr(MenuItem, column),
+                )
+                for column in columns
+            }
+            values["version"] = version
+            statement = update(MenuItem).where(MenuItem.id.in_(ids)).values(values).returning(MenuItem)
+            updated = db.scalars(statement, execution_options={"synchronize_session": False}).all()
+        else:
+            statement = update(MenuItem).where(MenuItem.id.in_(ids)).values(version=version).returning(MenuItem)
+            updated = db.scalars(statement, execution_options={"synchronize_session": False}).all()
+        missing = set(ids) - {item.id for item in updated}
+    else:
+        missing = set()
+    deleted = []
+    if deletes:
+        deleted = db.scalars(delete(MenuItem).where(MenuItem.id.in_(deletes)).returning(MenuItem.id)).all()
+        missing |= set(deletes) - set(deleted)
+    if missing:
+        db.rollback()
+        raise HTTPException(
+            status_code=404,
+            detail={"message": "Menu items not found", "missing": sorted(missing)}
+        )
+    record_deletions(db, deleted, version)
+    result = {"updated": sorted((_serialize_menu_item(item) for item in updated), key=lambda item: item["id"]), "deleted": sorted(deleted)}
+    db.commit()
+    return result, version
+
 @app.get("/api/menu/", response_model=List[MenuItemResponse])
-def get_menu_items(
-    response: Response,
-    skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(get_db)
+async def get_menu_items(
+    request: Request,
+    category: Optional[str] = None,
+    popular: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: Literal["id", "price", "-price", "name"] = "id",
+    cursor: Optional[str] = None,
+    skip: int = Query(0, deprecated=True, description="Use cursor instead"),
+    limit: int = 100
+):
+    """List menu items; follow X-Next-Cursor (or the Link header) for the next page"""
+    limit = clamp_page_size(limit)
+    filters = (category, popular, min_price, max_price)
+    after = _menu_cursor(cursor, sort)
+    if after is not None:
+        # The cursor already marks the position; skip only applies to the first page
+        skip = 0
+    key = ("list", filters, sort, after, skip, limit)
+    entry = menu_cache.get(key)
+    if entry is None:
+        async def load(db, version):
+            items = await run_db(db, _load_menu_page, filters, sort, after, skip, limit)
+            next_cursor = None
+            if len(items) > limit:
+                items = items[:limit]
+                columns, _ = _MENU_SORTS[sort]
+                next_cursor = encode_cursor([items[-1][column.key] for column in columns])
+            return menu_cache.put(key, items, version, page_headers(request.url, next_cursor))
+        entry = await _fill_shared(key, load)
+    return _cached_response(request, entry)
+
+@app.get("/api/menu/search", response_model=List[MenuItemResponse])
+async def search_menu_items(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = 20
+):
+    """Ranked prefix search over menu item names and descriptions"""
+    limit = clamp_page_size(limit)
+    key = ("search", " ".join(q.lower().split()), limit)
+    entry = menu_cache.get(key)
+    if entry is None:
+        if engine.dialect.name != "postgresql" and search_index_stale():
+            # Different searches share the one in-process index: rebuild it
+            # once, and if that takes longer than a search may, keep
+            # searching the one already built meanwhile
+            rebuild = _start_index_rebuild()
+            if search_index_version() is None:
+                await asyncio.shield(rebuild)
+            else:
+                await asyncio.wait([rebuild], timeout=MENU_SEARCH_TIMEOUT_MS / 1000)
+
+        async def load(db, version):
+            try:
+                items = await run_db(db, search_menu, q, limit, _serialize_menu_item)
+            except SearchTimeout:
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Search timed out")
+            # Results from an index a write has overtaken are served, not cached
+            index_version = search_index_version()
+            return menu_cache.put(key, items, version if index_version is None else min(version, index_version))
+        entry = await _fill_shared(key, load)
+    return _cached_response(request, entry)
+
+@app.get("/api/menu/changes", response_model=MenuChangesResponse)
+async def get_menu_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Version from the previous call; 0 for the whole menu")
+):
+    """Menu items changed and ids deleted since a change version"""
+    key = ("changes", since)
+    entry = menu_cache.get(key)
+    if entry is None:
+        async def load(db, version):
+            changes = await run_db(db, load_changes, since, _serialize_menu_item)
+            return menu_cache.put(key, changes, version)
+        entry = await _fill_shared(key, load)
+    return _cached_response(request, entry)
+
+@app.get("/api/menu/events")
+async def stream_menu_events(request: Request):
+    """Server-Sent Events stream of menu changes (created, updated, deleted, changed)"""
+    return StreamingResponse(
+        event_stream(menu_broadcaster, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/menu/export")
+async def export_menu_items(format: Literal[FORMATS] = "ndjson"):
+    """Stream every menu item as NDJSON or CSV"""
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_export(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="menu.{format}"'}
+    )
+
+@app.post("/api/menu/import")
+async def import_menu_items(
+    request: Request,
+    format: Optional[Literal[FORMATS]] = None,
+    db=Depends(get_db)
+):
+    """Bulk-load menu items from an NDJSON or CSV request body"""
+    importer = MenuImport(format or detect_format(content_type=request.headers.get("content-type")))
+    async for line in iter_body_lines(request.stream()):
+        batch = importer.feed(line)
+        if batch:
+            await run_db(db, importer.insert_batch, batch)
+    await run_db(db, importer.insert_batch, importer.flush())
+    if importer.inserted:
+        _menu_changed("changed", importer.version)
+    return importer.report()
+
+@app.get("/api/menu/batch", response_model=MenuItemsLookupResponse)
+async def get_menu_items_by_id(
+    ids: str = Query(..., description="Comma-separated menu item ids")
 ):
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
+    """Resolve many menu items at once; unknown ids are listed under missing"""
+    try:
+        requested = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be comma-separated integers")
+    if len(requested) > MENU_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"At most {MENU_BATCH_MAX_ITEMS} ids per request")
     
-    items = db.query(MenuItem).offset(skip).limit(limit).all()
-    return items
+    # Serve what the cache already holds, then one IN query for the rest
+    entries = {}
+    for item_id in requested:
+        entry = menu_cache.get(("item", item_id))
+        if entry is not None:
+            entries[item_id] = entry
+    unresolved = [item_id for item_id in requested if item_id not in entries]
+    if unresolved:
+        async def load(db, version):
+            items = await run_db(db, _load_menu_items, unresolved)
+            return {item["id"]: menu_cache.put(("item", item["id"]), item, version) for item in items}
+        entries.update(await _fill_shared(("batch", tuple(unresolved)), load))
+    
+    # Stitch the cached item bodies together instead of re-serializing them
+    found = [entries[item_id].body for item_id in requested if item_id in entries]
+    missing = [item_id for item_id in requested if item_id not in entries]
+    body = b'{"items":[' + b",".join(found) + b'],"missing":' + dump_json(missing) + b"}"
+    return Response(content=body, media_type="application/json")
 
 @app.get("/api/menu/{item_id}", response_model=MenuItemResponse)
-def get_menu_item(
+async def get_menu_item(
     item_id: int, 
-    response: Response,
-    db: Session = Depends(get_db)
+    request: Request
 ):
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Pragma"] = "no-cache"
-    response.headers["Expires"] = "0"
-    
-    db_item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
-    if db_item is None:
-        raise HTTPException(status_code=404, detail="Menu item not found")
-    return db_item
+    key = ("item", item_id)
+    entry = menu_cache.get(key)
+    if entry is None:
+        async def load(db, version):
+            item = await run_db(db, _load_menu_item, item_id)
+            if item is None:
+                raise HTTPException(status_code=404, detail="Menu item not found")
+            return menu_cache.put(key, item, version)
+        entry = await _fill_shared(key, load)
+    return _cached_response(request, entry)
 
 @app.post("/api/menu/", response_model=MenuItemResponse, status_code=status.HTTP_201_CREATED)
-def create_menu_item(
+async def create_menu_item(
     item: MenuItemCreate, 
-    db: Session = Depends(get_db)
+    db=Depends(get_db)
 ):
-    db_item = MenuItem(**item.dict())
-    
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    db_item, version = await run_db(db, _insert_menu_item, item.dict())
+    _menu_changed("created", version, [db_item["id"]])
     
     return db_item
 
 @app.put("/api/menu/{item_id}", response_model=MenuItemResponse)
-def update_menu_item(
+async def update_menu_item(
     item_id: int, 
     item: MenuItemCreate, 
-    db: Session = Depends(get_db)
+    db=Depends(get_db)
 ):
-    # Query the database for the item
-    db_item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
+    db_item, version = await run_db(db, _update_menu_item, item_id, item.dict(exclude_unset=True))
     
     # If item not found, return 404
     if db_item is None:
         raise HTTPException(status_code=404, detail="Menu item not found")
-    
-    # Update the item with new values
-    update_data = item.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_item, key, value)
-    
-    # Save changes to database
-    db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    _menu_changed("updated", version, [item_id])
     
     return db_item
 
+@app.patch("/api/menu/batch", response_model=MenuBatchResponse)
+async def batch_menu_items(
+    batch: MenuBatchRequest,
+    db=Depends(get_db)
+):
+    """Update and delete many menu items in a single transaction"""
+    update_ids = [patch.id for patch in batch.update]
+    if len(set(update_ids)) != len(update_ids) or len(set(batch.delete)) != len(batch.delete):
+        raise HTTPException(status_code=422, detail="Each menu item may appear only once per batch")
+    if set(update_ids) & set(batch.delete):
+        raise HTTPException(status_code=422, detail="A menu item cannot be both updated and deleted")
+    updates = [patch.model_dump(exclude_unset=True) | {"id": patch.id} for patch in batch.update]
+    result, version = await run_db(db, _apply_menu_batch, updates, batch.delete)
+    if result["updated"]:
+        _menu_changed("updated", version, [item["id"] for item in result["updated"]])
+    if result["deleted"]:
+        _menu_changed("deleted", version, result["deleted"])
+    return result
+
 @app.delete("/api/menu/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_menu_item(
+async def delete_menu_item(
     item_id: int, 
-    db: Session = Depends(get_db)
+    db=Depends(get_db)
 ):
-    # Query the database for the item
-    db_item = db.query(MenuItem).filter(MenuItem.id == item_id).first()
-    
     # If item not found, return 404
-    if db_item is None:
+    version = await run_db(db, _delete_menu_item, item_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Menu item not found")
-    
-    # Delete the item
-    db.delete(db_item)
-    db.commit()
+    _menu_changed("deleted", version, [item_id])
     
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
+# ============ CART ENDPOINTS ============
+
+@app.post("/api/cart/quote", response_model=CartQuoteResponse)
+async def quote_cart_items(
+    cart: CartQuoteRequest,
+    db=Depends(get_db)
+):
+    """Price a cart against current menu prices"""
+    table = current_price_table()
+    lines = [(line.item_id, line.quantity) for line in cart.lines]
+    unknown = table.unknown(dict.fromkeys(item_id for item_id, _ in lines))
+    if unknown:
+        await run_db(db, table.load, unknown)
+    return quote_cart(table, lines)
+
+startup_timings["import"] = time.perf_counter() - _import_started
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""
+Bulk menu import and export, as NDJSON or CSV.
+
+Imports are parsed line by line, validated against MenuItemCreate and written
+in batches of BULK_BATCH_SIZE rows, each batch in its own transaction (COPY on
+psycopg2, a multi-row INSERT elsewhere). Invalid rows are reported with their
+line number and skipped. Exports stream rows from a server-side cursor.
+
+Usage:
+    python menu_bulk.py import menu.ndjson
+    python menu_bulk.py import menu.csv
+    python menu_bulk.py export menu.csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from database import DATABASE_ASYNC, AsyncSessionLocal, SessionLocal, engine
+from menu_changes import ensure_change_counter, next_change_version
+from models import MenuItem
+from schemas import MenuItemCreate
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+# Per-row errors kept in an import report; the count keeps going past this
+BULK_MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FIELDS = ["name", "description", "price", "category", "image", "popular"]
+EXPORT_FIELDS = ["id"] + IMPORT_FIELDS + ["created_at"]
+FORMATS = ("ndjson", "csv")
+
+
+def detect_format(filename: str = None, content_type: str = None) -> str:
+    if content_type and "csv" in content_type:
+        return "csv"
+    if filename and filename.lower().endswith(".csv"):
+        return "csv"
+    return "ndjson"
+
+
+class _CsvRecords:
+    """Turn CSV lines into dicts, joining quoted fields that span lines"""
+
+    def __init__(self):
+        self.header = None
+        self._pending = ""
+
+    @property
+    def in_record(self) -> bool:
+        return bool(self._pending)
+
+    def reset(self):
+        self._pending = ""
+
+    def feed(self, line: str):
+        self._pending += line if not self._pending else "\n" + line
+        # An odd number of quotes means a quoted field continues on the next line
+        if self._pending.count('"') % 2:
+            return None
+        record, self._pending = self._pending, ""
+        values = next(csv.reader([record]), [])
+        if self.header is None:
+            self.header = [value.strip() for value in values]
+            return None
+        return dict(zip(self.header, values))
+
+
+def _clean_csv_row(row: dict) -> dict:
+    row = {key: value for key, value in row.items() if key in IMPORT_FIELDS}
+    if row.get("image") == "":
+        row["image"] = None
+    if row.get("popular") == "":
+        row.pop("popular")
+    return row
+
+
+class MenuImport:
+    """Parse, validate and batch one import; feed it lines, insert what it returns"""
+
+    def __init__(self, fmt: str, batch_size: int = BULK_BATCH_SIZE):
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.inserted = 0
+        # Change version of the last committed batch
+        self.version = None
+        self.failed = 0
+        self.errors = []
+        self._line_no = 0
+        self._record_line = None
+        self._csv = _CsvRecords() if fmt == "csv" else None
+        self._pending = []
+
+    def _error(self, line_no: int, message: str):
+        self.failed += 1
+        if len(self.errors) < BULK_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": message})
+
+    def feed(self, line: str):
+        """Take one input line; return a full batch once one is ready"""
+        self._line_no += 1
+        line = line.rstrip("\r\n")
+        if self._csv is not None:
+            if self._record_line is None:
+                self._record_line = self._line_no
+            row = self._csv.feed(line)
+            if self._csv.in_record:
+                return None
+            line_no, self._record_line = self._record_line, None
+            if row is None:
+                return None
+            row = _clean_csv_row(row)
+        else:
+            line_no = self._line_no
+            if not line.strip():
+                return None
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                self._error(line_no, f"Invalid JSON: {exc}")
+                return None
+        try:
+            item = MenuItemCreate.model_validate(row)
+        except ValidationError as exc:
+            self._error(line_no, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+                for error in exc.errors()
+            ))
+            return None
+        self._pending.append((line_no, item.model_dump()))
+        if len(self._pending) >= self.batch_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Return whatever rows are still waiting to be inserted"""
+        if self._csv is not None and self._csv.in_record:
+            self._error(self._record_line, "Unterminated quoted field")
+            self._csv.reset()
+        batch, self._pending = self._pending, []
+        return batch
+
+    def insert_batch(self, db: Session, batch):
+        """Write one batch in its own transaction"""
+        if not batch:
+            return
+        created_at = datetime.utcnow()
+        try:
+            version = next_change_version(db)
+            rows = [dict(row, created_at=created_at, version=version) for _, row in batch]
+            if db.get_bind().dialect.driver == "psycopg2":
+                _copy_rows(db, rows)
+            else:
+                db.execute(insert(MenuItem), rows)
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            for line_no, _ in batch:
+                self._error(line_no, f"Database error: {exc.__class__.__name__}")
+            return
+        self.inserted += len(rows)
+        self.version = version
+
+    def report(self) -> dict:
+        return {"inserted": self.inserted, "failed": self.failed, "errors": self.errors}
+
+
+COPY_COLUMNS = IMPORT_FIELDS + ["created_at", "version"]
+COPY_OPTIONS = "FORMAT csv, NULL '\\N'"
+
+
+def _copy_field(value) -> str:
+    # NULL is an explicit unquoted \N and every string is quoted, so "" stays
+    # an empty string (and a literal "\N" stays text)
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def _copy_csv(rows) -> str:
+    """COPY ... WITH (COPY_OPTIONS) input for rows of COPY_COLUMNS"""
+    return "".join(",".join(_copy_field(row[column]) for column in COPY_COLUMNS) + "\n" for row in rows)
+
+
+def _copy_rows(db: Session, rows):
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {MenuItem.__tablename__} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH ({COPY_OPTIONS})",
+            io.StringIO(_copy_csv(rows)),
+        )
+    finally:
+        cursor.close()
+
+
+async def iter_body_lines(chunks):
+    """Split an async stream of byte chunks into text lines"""
+    buffer = b""
+    first = True
+    async for chunk in chunks:
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8-sig" if first else "utf-8")
+            first = False
+    if buffer:
+        yield buffer.decode("utf-8-sig" if first else "utf-8")
+
+
+def export_query():
+    return select(MenuItem).order_by(MenuItem.id).execution_options(yield_per=BULK_BATCH_SIZE)
+
+
+def export_header(fmt: str) -> str:
+    if fmt != "csv":
+        return ""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_FIELDS)
+    return buffer.getvalue()
+
+
+def export_rows(items, fmt: str) -> str:
+    """Render a chunk of MenuItem rows"""
+    rows = [
+        {field: getattr(item, field) for field in EXPORT_FIELDS}
+        for item in items
+    ]
+    for row in rows:
+        if row["created_at"] is not None:
+            row["created_at"] = row["created_at"].isoformat()
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writerows(rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+def iter_export(db: Session, fmt: str):
+    """Yield an export chunk by chunk from a sync session"""
+    yield export_header(fmt)
+    for partition in db.execute(export_query()).scalars().partitions():
+        yield export_rows(partition, fmt)
+
+
+async def stream_export(fmt: str):
+    """Yield an export from its own session, so it outlives the request's"""
+    if DATABASE_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield export_header(fmt)
+            result = await db.stream(export_query())
+            async for partition in result.scalars().partitions():
+                yield export_rows(partition, fmt)
+    else:
+        db = SessionLocal()
+        try:
+            async for chunk in iterate_in_threadpool(iter_export(db, fmt)):
+                yield chunk
+        finally:
+            await run_in_threadpool(db.close)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import / export menu items")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="file to read or write ('-' for stdin/stdout)")
+    parser.add_argument("--format", choices=FORMATS, help="defaults from the file extension")
+    args = parser.parse_args(argv)
+    fmt = args.format or detect_format(args.path)
+
+    if args.command == "import":
+        ensure_change_counter(engine)
+    db = SessionLocal()
+    try:
+        if args.command == "import":
+            source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+            importer = MenuImport(fmt)
+            with source:
+                for line in source:
+                    importer.insert_batch(db, importer.feed(line))
+            importer.insert_batch(db, importer.flush())
+            report = importer.report()
+            print(f"✅ Imported {report['inserted']} menu items, {report['failed']} failed")
+            for error in report["errors"]:
+                print(f"  line {error['line']}: {error['error']}")
+            return 1 if report["failed"] else 0
+        target = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8", newline="")
+        with target:
+            for chunk in iter_export(db, fmt):
+                target.write(chunk)
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
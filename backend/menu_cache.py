@@ -0,0 +1,153 @@
+"""
+In-process cache for menu reads.
+
+Entries are keyed by query shape and tagged with the data version that was
+current when they were loaded. The menu write endpoints bump the version, so
+a write drops every cached read in this process. MENU_CACHE_TTL bounds how
+long another worker's writes can go unnoticed; set it to 0 to disable caching.
+
+Each entry keeps its JSON body as bytes, plus gzip and brotli variants built
+the first time a client asks for them, so a cache hit does no serialization.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; fall back to gzip only
+    brotli = None
+
+MENU_CACHE_TTL = float(os.getenv("MENU_CACHE_TTL", "5"))
+MENU_CACHE_MAX_ENTRIES = int(os.getenv("MENU_CACHE_MAX_ENTRIES", "512"))
+# Bodies smaller than this are not worth compressing
+MENU_COMPRESS_MIN_BYTES = int(os.getenv("MENU_COMPRESS_MIN_BYTES", "512"))
+
+_COMPRESSORS = {"gzip": lambda body: gzip.compress(body, compresslevel=6, mtime=0)}
+if brotli is not None:
+    _COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=5)
+
+
+def dump_json(data) -> bytes:
+    """Serialize data the same way FastAPI's JSONResponse does"""
+    return json.dumps(
+        data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    """Build a strong ETag from a response body"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """Pick the best content coding we have for an Accept-Encoding header"""
+    if not accept_encoding:
+        return "identity"
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for coding in ("br", "gzip"):
+        if coding in _COMPRESSORS and accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return "identity"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # If-None-Match uses the weak comparison function
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class CacheEntry:
+    __slots__ = ("version", "data", "headers", "body", "etag", "expires_at", "_encoded")
+
+    def __init__(self, version: int, data, expires_at: float, headers: dict = None):
+        self.version = version
+        self.data = data
+        self.headers = headers or {}
+        self.body = dump_json(data)
+        self.etag = make_etag(self.body)
+        self.expires_at = expires_at
+        self._encoded = {}
+
+    def encoded(self, encoding: str):
+        """Return (body, etag) for a content coding, compressing on first use"""
+        if encoding == "identity" or len(self.body) < MENU_COMPRESS_MIN_BYTES:
+            return self.body, self.etag
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = _COMPRESSORS[encoding](self.body)
+            self._encoded[encoding] = body
+        # A strong ETag has to differ between content codings
+        return body, self.etag[:-1] + "-" + encoding + '"'
+
+
+class MenuCache:
+    def __init__(self, ttl: float = MENU_CACHE_TTL, max_entries: int = MENU_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        """Current data version; read it before loading data to cache"""
+        return self._version
+
+    def get(self, key):
+        """Return the live entry for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != self._version or entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, data, version: int, headers: dict = None) -> CacheEntry:
+        """Wrap data loaded at version in an entry and cache it if still current"""
+        entry = CacheEntry(version, data, time.monotonic() + self.ttl, headers)
+        with self._lock:
+            # A write landed while the data was loading - serve it, don't keep it
+            if self.ttl > 0 and version == self._version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self) -> int:
+        """Bump the data version and drop every cached entry"""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            return self._version
+
+
+menu_cache = MenuCache()
@@ -0,0 +1,110 @@
+"""
+Menu change versions and delta sync.
+
+Every menu write takes the next value of a single-row counter with UPDATE ...
+RETURNING and stamps it on the rows it touches (deletions leave a tombstone
+carrying it). The counter's row lock is held until the write commits, so
+versions become visible in order and "everything after version N" is a plain
+range scan on the version index. Each worker also polls the counter, which is
+how it learns about writes handled by other workers. The client change
+counter (bumped by a trigger, see models.py) is read and watched the same way.
+"""
+import asyncio
+import os
+from datetime import datetime
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import run_db, session_scope
+from models import MenuChangeCounter, MenuItem, MenuItemTombstone
+
+# Changes a delta may hold before the client is told to reload instead
+MENU_CHANGES_MAX = int(os.getenv("MENU_CHANGES_MAX", "5000"))
+# Seconds between checks for menu writes made by other workers; 0 disables
+MENU_CHANGES_POLL_INTERVAL = float(os.getenv("MENU_CHANGES_POLL_INTERVAL", "2"))
+
+_COUNTER_ID = 1
+
+
+def ensure_change_counter(bind, model=MenuChangeCounter):
+    """Create the counter row if this database does not have it yet"""
+    counter = model.__table__
+    try:
+        with bind.begin() as conn:
+            if conn.execute(select(counter.c.id).where(counter.c.id == _COUNTER_ID)).first() is None:
+                conn.execute(insert(counter).values(id=_COUNTER_ID, version=0))
+    except IntegrityError:
+        # Another worker created it first
+        pass
+
+
+def next_change_version(db: Session) -> int:
+    """Claim the next version; blocks other menu writers until this transaction ends"""
+    statement = (
+        update(MenuChangeCounter)
+        .where(MenuChangeCounter.id == _COUNTER_ID)
+        .values(version=MenuChangeCounter.version + 1)
+        .returning(MenuChangeCounter.version)
+    )
+    return db.execute(statement, execution_options={"synchronize_session": False}).scalar_one()
+
+
+def current_change_version(db: Session, model=MenuChangeCounter) -> int:
+    statement = select(model.version).where(model.id == _COUNTER_ID)
+    return db.execute(statement).scalar_one_or_none() or 0
+
+
+def record_deletions(db: Session, ids, version: int):
+    deleted_at = datetime.utcnow()
+    if ids:
+        db.execute(insert(MenuItemTombstone), [
+            {"item_id": item_id, "version": version, "deleted_at": deleted_at} for item_id in ids
+        ])
+
+
+def load_changes(db: Session, since: int, serialize) -> dict:
+    """Items written and ids deleted after version since, up to the current version.
+
+    since=0 returns the whole menu. Clients apply deleted before items, then
+    keep the returned version for their next call. A reset answer means the
+    delta is too large: reload the menu, then continue from its version.
+    """
+    # Read the counter first; rows stamped after it belong to the next delta
+    version = current_change_version(db)
+    reset = {"version": version, "reset": True, "items": [], "deleted": []}
+    if since > version:
+        return reset
+    query = db.query(MenuItem).filter(MenuItem.version <= version)
+    if since > 0:
+        query = query.filter(MenuItem.version > since)
+    items = query.order_by(MenuItem.version, MenuItem.id).limit(MENU_CHANGES_MAX + 1).all()
+    deleted = []
+    if since > 0:
+        deleted = db.scalars(
+            select(MenuItemTombstone.item_id)
+            .where(MenuItemTombstone.version > since, MenuItemTombstone.version <= version)
+            .order_by(MenuItemTombstone.version)
+            .limit(MENU_CHANGES_MAX + 1)
+        ).all()
+    if len(items) + len(deleted) > MENU_CHANGES_MAX:
+        return reset
+    return {
+        "version": version,
+        "reset": False,
+        "items": [serialize(item) for item in items],
+        "deleted": list(dict.fromkeys(deleted)),
+    }
+
+
+async def watch_changes(on_change, last_version, model=MenuChangeCounter, interval=None):
+    """Poll the counter and call on_change(version) when it moves past last_version()"""
+    while True:
+        try:
+            async with session_scope() as db:
+                version = await run_db(db, current_change_version, model)
+        except Exception:
+            # The database being briefly unreachable must not end the watcher
+            version = None
+        if version is not None and version > last_version():
+            on_change(version)
+        await asyncio.sleep(MENU_CHANGES_POLL_INTERVAL if interval is None else interval)
@@ -0,0 +1,82 @@
+"""
+Menu change notifications over Server-Sent Events.
+
+The write endpoints publish one small event per change to a broadcaster that
+lives on the worker's event loop. Each subscriber owns a bounded queue, so an
+idle connection costs one queue and one suspended generator. Event ids are
+menu change versions, so a client can always catch up through
+/api/menu/changes?since=<last id>. A "changed" event carries no ids and means
+exactly that: it is sent for writes seen on other workers, to subscribers that
+fell too far behind, and to reconnecting clients that missed events.
+"""
+import asyncio
+import json
+import os
+
+# Events a subscriber may have queued before it is told to resync
+MENU_EVENTS_QUEUE_SIZE = int(os.getenv("MENU_EVENTS_QUEUE_SIZE", "100"))
+# Seconds between keep-alive comments on an idle stream
+MENU_EVENTS_HEARTBEAT = float(os.getenv("MENU_EVENTS_HEARTBEAT", "15"))
+
+
+class MenuBroadcaster:
+    def __init__(self, queue_size: int = MENU_EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        # Latest change version published on this worker
+        self.version = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event_type: str, version: int, ids=()):
+        """Queue an event for every subscriber; call from the event loop"""
+        self.version = max(self.version, version)
+        event = {"type": event_type, "version": version, "ids": list(ids)}
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                _replace_backlog(queue, version)
+
+
+def _replace_backlog(queue: asyncio.Queue, version: int):
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait({"type": "changed", "version": version, "ids": []})
+
+
+def format_event(event: dict) -> str:
+    return f"id: {event['version']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def event_stream(broadcaster: MenuBroadcaster, last_event_id: str = None):
+    """Yield SSE frames for one subscriber until the client goes away"""
+    queue = broadcaster.subscribe()
+    try:
+        yield "retry: 5000\n\n"
+        # A reconnecting client that missed changes has to catch up
+        current_version = broadcaster.version
+        if last_event_id is not None and last_event_id != str(current_version):
+            yield format_event({"type": "changed", "version": current_version, "ids": []})
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=MENU_EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broadcaster.unsubscribe(queue)
+
+
+menu_broadcaster = MenuBroadcaster()
@@ -0,0 +1,174 @@
+"""
+Ranked full-text search over menu item names and descriptions.
+
+On PostgreSQL the query runs against the ix_menu_items_search GIN index with
+a statement timeout. Other databases (SQLite for local runs) get an in-process
+inverted index built from the menu and rebuilt after menu writes. In both cases
+every search term is matched as a prefix, which is what type-ahead needs.
+"""
+import re
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from menu_cache import menu_cache, MENU_CACHE_TTL
+from menu_changes import MENU_CHANGES_POLL_INTERVAL
+from models import MenuItem, menu_search_vector
+import os
+
+# Longest a single search may run on PostgreSQL
+MENU_SEARCH_TIMEOUT_MS = int(os.getenv("MENU_SEARCH_TIMEOUT_MS", "200"))
+# Search terms beyond this many are ignored
+MENU_SEARCH_MAX_TERMS = 8
+# Vocabulary words a single prefix may expand to in the in-process index
+MENU_SEARCH_MAX_EXPANSIONS = 256
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def tokenize(value: str):
+    return _TOKEN.findall(value.lower()) if value else []
+
+
+def search_menu(db: Session, q: str, limit: int, serialize):
+    """Return up to limit serialized items matching every term of q, best first"""
+    terms = tokenize(q)[:MENU_SEARCH_MAX_TERMS]
+    if not terms:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        return [serialize(item) for item in _search_postgres(db, terms, limit)]
+    index = _inverted_index.current(db, serialize)
+    return index.search(terms, limit)
+
+
+def _search_postgres(db: Session, terms, limit: int):
+    query = func.to_tsquery(text("'simple'"), " & ".join(term + ":*" for term in terms))
+    vector = menu_search_vector()
+    # SET LOCAL only lasts until the end of this read transaction
+    db.execute(text(f"SET LOCAL statement_timeout = {MENU_SEARCH_TIMEOUT_MS:d}"))
+    try:
+        return (
+            db.query(MenuItem)
+            .filter(vector.op("@@")(query))
+            .order_by(func.ts_rank(vector, query).desc(), MenuItem.id)
+            .limit(limit)
+            .all()
+        )
+    except DBAPIError as exc:
+        db.rollback()
+        if "statement timeout" in str(exc.orig):
+            raise SearchTimeout() from exc
+        raise
+
+
+class _InvertedIndex:
+    # Name matches outrank description matches; whole words outrank prefixes
+    NAME_WEIGHT = 3
+    DESCRIPTION_WEIGHT = 1
+    EXACT_BONUS = 2
+
+    def __init__(self, version: int, items):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.items = {item["id"]: item for item in items}
+        postings = defaultdict(dict)
+        for item in items:
+            for weight, field in ((self.NAME_WEIGHT, "name"), (self.DESCRIPTION_WEIGHT, "description")):
+                for token in tokenize(item.get(field)):
+                    scores = postings[token]
+                    scores[item["id"]] = scores.get(item["id"], 0) + weight
+        self.postings = dict(postings)
+        self.vocabulary = sorted(self.postings)
+
+    def _matches(self, term: str) -> dict:
+        scores = {}
+        start = bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:start + MENU_SEARCH_MAX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            bonus = self.EXACT_BONUS if token == term else 1
+            for item_id, weight in self.postings[token].items():
+                scores[item_id] = scores.get(item_id, 0) + weight * bonus
+        return scores
+
+    def search(self, terms, limit: int):
+        totals = None
+        for term in terms:
+            scores = self._matches(term)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {item_id: totals[item_id] + score for item_id, score in scores.items() if item_id in totals}
+            if not totals:
+                return []
+        ranked = sorted(totals.items(), key=lambda pair: (-pair[1], pair[0]))[:limit]
+        return [self.items[item_id] for item_id, _ in ranked]
+
+
+class _IndexHolder:
+    """Keeps one inverted index per worker, rebuilt when the menu version moves"""
+
+    def __init__(self):
+        self._index = None
+
+    def stale(self) -> bool:
+        index = self._index
+        if index is None or index.version != menu_cache.version:
+            return True
+        # Other workers' writes move the version through the change watcher;
+        # without it, fall back to rebuilding every MENU_CACHE_TTL
+        return MENU_CHANGES_POLL_INTERVAL <= 0 and time.monotonic() - index.built_at >= MENU_CACHE_TTL
+
+    def rebuild(self, db: Session, serialize) -> _InvertedIndex:
+        version = menu_cache.version
+        return self.install(version, load_search_rows(db), serialize)
+
+    def install(self, version: int, rows, serialize) -> _InvertedIndex:
+        index = _InvertedIndex(version, [serialize(item) for item in rows])
+        # A slower rebuild that started earlier must not replace a newer index
+        if self._index is None or self._index.version <= version:
+            self._index = index
+        return index
+
+    def current(self, db: Session, serialize) -> _InvertedIndex:
+        # Serve the index already built, even if a write has just landed:
+        # rebuilding here would have every concurrent search reload the whole
+        # menu. Callers bring it up to date once, through install_search_index.
+        if self._index is None:
+            return self.rebuild(db, serialize)
+        return self._index
+
+
+_inverted_index = _IndexHolder()
+
+
+def search_index_stale() -> bool:
+    """Whether the in-process index needs rebuilding before the next search"""
+    return _inverted_index.stale()
+
+
+def load_search_rows(db: Session):
+    """Every menu item, for a rebuild of the in-process index"""
+    # Plain rows rather than ORM objects: much cheaper to load, and the
+    # serializer reads them by attribute just the same
+    rows = db.execute(select(MenuItem.__table__).order_by(MenuItem.id)).all()
+    # End the read before the CPU-bound part; on SQLite it holds off writers
+    db.close()
+    return rows
+
+
+def install_search_index(version: int, rows, serialize):
+    """Build the in-process index from rows loaded at version (CPU-bound)"""
+    _inverted_index.install(version, rows, serialize)
+
+
+def search_index_version():
+    """Menu version the in-process index was built at, None if there is none"""
+    index = _inverted_index._index
+    return None if index is None else index.version
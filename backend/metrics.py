@@ -0,0 +1,210 @@
+"""
+Request and database metrics in Prometheus text format.
+
+MetricsMiddleware is a plain ASGI middleware: it matches each request to its
+route template, counts it in flight while it runs, and records its latency and
+status code. SQLAlchemy cursor events add the number of statements and the
+time spent in them to the request being served, found through a context
+variable (threadpool calls and run_sync both carry it along). Numbers are per
+worker process, like /api/internal/pool.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from starlette.routing import Match
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Label for requests that match no route, so stray paths cannot add series
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestDbStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_request_db_stats: ContextVar = ContextVar("request_db_stats", default=None)
+
+
+class RouteStats:
+    """Counters for one (method, route) pair"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.statuses = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.seconds_total = 0.0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+    def observe(self, status_code: int, seconds: float, db: RequestDbStats):
+        self.statuses[status_code] = self.statuses.get(status_code, 0) + 1
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.seconds_total += seconds
+        self.db_queries += db.queries
+        self.db_seconds += db.seconds
+
+
+class Metrics:
+    def __init__(self):
+        # (method, route) -> RouteStats; only touched from the event loop
+        self.routes = {}
+
+    def route(self, method: str, path: str) -> RouteStats:
+        key = (method, path)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats()
+        return stats
+
+
+metrics = Metrics()
+# Seconds spent importing the app and running its startup, set by main
+startup_timings = {}
+
+
+def _route_template(scope) -> str:
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    partial = None
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = metrics.route(scope["method"], _route_template(scope))
+        db_stats = RequestDbStats()
+        token = _request_db_stats.set(db_stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            stats.in_flight -= 1
+            stats.observe(status_code, time.perf_counter() - started, db_stats)
+            _request_db_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    db_stats = _request_db_stats.get()
+    if db_stats is not None:
+        db_stats.queries += 1
+        db_stats.seconds += time.perf_counter() - started
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def instrument_engine(engine):
+    """Attribute statements run on a sync Engine to the current request"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _family(lines, name: str, kind: str, help_text: str, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    lines.extend(samples)
+
+
+# Cumulative fields of the pool / hashing snapshots; the rest are gauges
+_COUNTER_FIELDS = {"checkouts", "timeouts", "wait_seconds_total", "completed", "rejected", "pool_restarts", "calls", "shared"}
+
+
+def _snapshot_families(lines, prefix: str, snapshot: dict):
+    for field, value in snapshot.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if field in _COUNTER_FIELDS:
+            name = f"{prefix}_{field}" if field.endswith("_total") else f"{prefix}_{field}_total"
+            _family(lines, name, "counter", f"{prefix} {field}", [f"{name} {value}"])
+        else:
+            _family(lines, f"{prefix}_{field}", "gauge", f"{prefix} {field}", [f"{prefix}_{field} {value}"])
+
+
+def render_metrics(pool: dict, hashing: dict, flights: dict) -> str:
+    """Everything above, plus pool, hashing and read coalescing stats, in Prometheus text format"""
+    routes = sorted(metrics.routes.items())
+    lines = []
+    _family(lines, "http_requests_in_flight", "gauge", "Requests being served", [
+        f"http_requests_in_flight{_labels(method=method, route=route)} {stats.in_flight}"
+        for (method, route), stats in routes
+    ])
+    _family(lines, "http_requests_total", "counter", "Requests served, by status code", [
+        f"http_requests_total{_labels(method=method, route=route, status=code)} {count}"
+        for (method, route), stats in routes
+        for code, count in sorted(stats.statuses.items())
+    ])
+    samples = []
+    for (method, route), stats in routes:
+        count = sum(stats.buckets)
+        if not count:
+            continue
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, stats.buckets):
+            cumulative += bucket
+            samples.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+        samples.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le='+Inf')} {count}")
+        samples.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {stats.seconds_total:.6f}")
+        samples.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {count}")
+    _family(lines, "http_request_duration_seconds", "histogram", "Request latency", samples)
+    _family(lines, "db_queries_total", "counter", "SQL statements run while serving requests", [
+        f"db_queries_total{_labels(method=method, route=route)} {stats.db_queries}"
+        for (method, route), stats in routes
+    ])
+    _family(lines, "db_query_seconds_total", "counter", "Time spent in SQL statements while serving requests", [
+        f"db_query_seconds_total{_labels(method=method, route=route)} {stats.db_seconds:.6f}"
+        for (method, route), stats in routes
+    ])
+    for phase, seconds in sorted(startup_timings.items()):
+        _family(lines, f"app_{phase}_seconds", "gauge", f"Seconds this worker spent in app {phase}", [
+            f"app_{phase}_seconds {seconds:.6f}"
+        ])
+    _snapshot_families(lines, "db_pool", pool)
+    _snapshot_families(lines, "hash_pool", hashing)
+    _snapshot_families(lines, "single_flight", flights)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,110 @@
+"""
+Create or check the database schema.
+
+The app no longer touches the schema when it is imported; run this once per
+deploy (the Procfile release step and startup.sh do) before starting workers.
+It creates missing tables, adds columns and indexes added to the models since
+the tables were created, seeds the menu and client change counters and
+installs the triggers that bump the client one. Re-running it is safe.
+
+Usage:
+    python migrate.py            # bring the schema up to date
+    python migrate.py --check    # report what is missing; exit 1 if anything is
+"""
+import argparse
+import os
+import sys
+import time
+from sqlalchemy import inspect, select
+from database import engine
+from menu_changes import ensure_change_counter
+from models import (
+    Base,
+    ClientChangeCounter,
+    MenuChangeCounter,
+    add_missing_columns,
+    create_client_triggers,
+    create_missing_indexes,
+)
+
+# What each worker does about the schema once it has started, as the first
+# warm-up step: "off" (migrate.py runs before the app), "verify" (log anything
+# missing) or "create" (bootstrap, for development / single instances)
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "off").lower()
+
+
+def bootstrap_schema(bind=engine):
+    """Create whatever the models define that the database does not have yet"""
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind)
+    create_missing_indexes(bind)
+    ensure_change_counter(bind)
+    ensure_change_counter(bind, ClientChangeCounter)
+    create_client_triggers(bind)
+
+
+def schema_problems(bind=engine) -> list:
+    """Describe each table, column, index or row the app needs but cannot find"""
+    inspector = inspect(bind)
+    problems = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            problems.append(f"missing table {table.name}")
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        problems.extend(
+            f"missing column {table.name}.{column.name}" for column in table.columns if column.name not in columns
+        )
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        problems.extend(
+            f"missing index {index.name}"
+            for index in table.indexes
+            # Dialect-specific indexes (the PostgreSQL search index) only exist there
+            if index.name not in indexes and _applies(index, bind)
+        )
+    if not problems:
+        with bind.connect() as conn:
+            if conn.execute(select(MenuChangeCounter.id)).first() is None:
+                problems.append("missing menu change counter row")
+            if conn.execute(select(ClientChangeCounter.id)).first() is None:
+                problems.append("missing client change counter row")
+    return problems
+
+
+def _applies(index, bind) -> bool:
+    ddl_if = getattr(index, "_ddl_if", None)
+    return ddl_if is None or ddl_if.dialect is None or ddl_if.dialect == bind.dialect.name
+
+
+def startup_schema_check(mode: str = SCHEMA_CHECK) -> list:
+    """Run the SCHEMA_CHECK step; returns problems found, if any"""
+    if mode == "create":
+        bootstrap_schema()
+        return []
+    if mode == "verify":
+        return schema_problems()
+    return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or check the database schema")
+    parser.add_argument("--check", action="store_true", help="only report what is missing")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.check:
+        problems = schema_problems()
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            print("Run `python migrate.py` to fix")
+            return 1
+        print(f"✅ Schema is up to date ({time.perf_counter() - started:.2f}s)")
+        return 0
+    bootstrap_schema()
+    print(f"✅ Schema is up to date ({time.perf_counter() - started:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,12 +3,21 @@ from sqlalchemy import Column, Integer, String, Float, Text, Boolean
 from database import Base
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, DateTime, Index, func, inspect, text
 from database import Base
 from datetime import datetime
 
 class MenuItem(Base):
     __tablename__ = "menu_items"
+    __table_args__ = (
+        # Category pages, in id order or sorted / ranged by price
+        Index("ix_menu_items_category_id", "category", "id"),
+        Index("ix_menu_items_category_price", "category", "price", "id"),
+        # Popular items, optionally narrowed to a category
+        Index("ix_menu_items_popular_category", "popular", "category", "id"),
+        # Whole-menu price sort and price ranges
+        Index("ix_menu_items_price", "price", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -18,6 +27,43 @@ class MenuItem(Base):
     image = Column(String, nullable=True)
     popular = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Change version of the last write to this row, for /api/menu/changes
+    version = Column(BigInteger, nullable=False, default=0, server_default="0", index=True)
+
+class MenuItemTombstone(Base):
+    """Deleted menu item ids, kept so delta sync can report deletions"""
+    __tablename__ = "menu_item_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, nullable=False)
+    version = Column(BigInteger, nullable=False, index=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+class MenuChangeCounter(Base):
+    """Single row holding the latest menu change version"""
+    __tablename__ = "menu_change_counter"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class ClientChangeCounter(Base):
+    """Single row bumped by a database trigger whenever a client row is updated or deleted"""
+    __tablename__ = "client_change_counter"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+def menu_search_vector():
+    """Full-text vector over name and description, as indexed by ix_menu_items_search"""
+    # Constants are inlined so queries render exactly the indexed expression
+    return func.to_tsvector(
+        text("'simple'"),
+        func.coalesce(MenuItem.name, text("''")) + text("' '") + func.coalesce(MenuItem.description, text("''")),
+    )
+
+# GIN index for /api/menu/search; other databases use the in-process index in menu_search.py
+Index("ix_menu_items_search", menu_search_vector(), postgresql_using="gin").ddl_if(dialect="postgresql")
+
 class HomePageContent(Base):
     __tablename__ = 'home_page_content'
     
@@ -44,3 +90,62 @@ class Client(Base):
     name = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+def add_missing_columns(bind):
+    """Add columns added to the models after their tables already existed.
+
+    Only suitable for columns that are nullable or have a server default.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(bind.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                conn.execute(text(ddl))
+
+
+# Fire for every UPDATE / DELETE on clients, whoever issues it (ORM, Core,
+# another worker, a script or plain SQL)
+_CLIENT_TRIGGERS = {
+    "postgresql": [
+        """CREATE OR REPLACE FUNCTION bump_client_change_counter() RETURNS trigger AS $$
+        BEGIN
+            UPDATE client_change_counter SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS clients_changed ON clients",
+        "CREATE TRIGGER clients_changed AFTER UPDATE OR DELETE ON clients "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_client_change_counter()",
+    ],
+    "sqlite": [
+        "CREATE TRIGGER IF NOT EXISTS clients_updated AFTER UPDATE ON clients "
+        "BEGIN UPDATE client_change_counter SET version = version + 1 WHERE id = 1; END",
+        "CREATE TRIGGER IF NOT EXISTS clients_deleted AFTER DELETE ON clients "
+        "BEGIN UPDATE client_change_counter SET version = version + 1 WHERE id = 1; END",
+    ],
+}
+
+
+def create_client_triggers(bind):
+    """Install the triggers that bump client_change_counter; other databases rely on AUTH_CACHE_TTL"""
+    with bind.begin() as conn:
+        for ddl in _CLIENT_TRIGGERS.get(bind.dialect.name, []):
+            conn.execute(text(ddl))
+
+
+def create_missing_indexes(bind):
+    """Create indexes added to the models after their tables already existed"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
@@ -0,0 +1,56 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last row on a page, base64-encoded so clients
+treat it as opaque. The next page is read with WHERE key > cursor, which an
+index answers directly however deep the page is.
+"""
+import base64
+import json
+import os
+from typing import Optional
+from fastapi import HTTPException, status
+
+# Largest page any list endpoint will return
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "500"))
+
+
+def clamp_page_size(limit: int) -> int:
+    return max(1, min(limit, PAGE_SIZE_MAX))
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]):
+    """Return the key tuple stored in a cursor, or None for the first page"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or not values:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return tuple(values)
+
+
+def cursor_matches(values, types) -> bool:
+    """Whether a decoded cursor has one value of each sort column's Python type"""
+    # type() rather than isinstance(): JSON true must not pass for an int
+    return len(values) == len(types) and all(
+        type(value) in (int, float) if python_type is float else type(value) is python_type
+        for value, python_type in zip(values, types)
+    )
+
+
+def page_headers(request_url, next_cursor: Optional[str]) -> dict:
+    """X-Next-Cursor and Link headers pointing at the next page"""
+    if next_cursor is None:
+        return {}
+    # The cursor replaces the deprecated offset; keeping skip would apply it twice
+    next_url = request_url.remove_query_params("skip").include_query_params(cursor=next_cursor)
+    return {"X-Next-Cursor": next_cursor, "Link": f'<{next_url.path}?{next_url.query}>; rel="next"'}
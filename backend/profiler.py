@@ -0,0 +1,209 @@
+"""
+Opt-in SQL profiler for development (QUERY_PROFILER=true).
+
+Every statement a request runs is recorded through SQLAlchemy cursor events.
+When the request ends, statements are grouped by shape (the SQL text with
+bind values and IN lists collapsed), so the same query run once per row shows
+up as one shape with a high count, the N+1 pattern. Statements slower than
+QUERY_PROFILER_SLOW_MS are listed and, with QUERY_PROFILER_EXPLAIN, EXPLAINed
+on the spot. A summary goes out in the X-Query-Profile response header and
+the last QUERY_PROFILER_HISTORY profiles are kept for /api/internal/profiler.
+"""
+import itertools
+import logging
+import os
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from sqlalchemy import event
+
+QUERY_PROFILER = os.getenv("QUERY_PROFILER", "false").lower() in ("1", "true", "yes")
+# Statements slower than this are reported individually
+QUERY_PROFILER_SLOW_MS = float(os.getenv("QUERY_PROFILER_SLOW_MS", "100"))
+# Runs of one statement shape at or above this count are reported as N+1 suspects
+QUERY_PROFILER_DUPLICATE_THRESHOLD = int(os.getenv("QUERY_PROFILER_DUPLICATE_THRESHOLD", "2"))
+# EXPLAIN slow SELECTs (PostgreSQL and SQLite), up to three per request
+QUERY_PROFILER_EXPLAIN = os.getenv("QUERY_PROFILER_EXPLAIN", "false").lower() in ("1", "true", "yes")
+QUERY_PROFILER_MAX_EXPLAINS = 3
+# Profiles kept for /api/internal/profiler
+QUERY_PROFILER_HISTORY = int(os.getenv("QUERY_PROFILER_HISTORY", "100"))
+# Statements kept per request; bulk imports beyond this are only counted
+QUERY_PROFILER_MAX_STATEMENTS = 1000
+
+logger = logging.getLogger("query_profiler")
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(\?|%s|%\(\w+\)s|\$\d+|:\w+)(\s*,\s*(\?|%s|%\(\w+\)s|\$\d+|:\w+))+\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+
+
+def statement_shape(statement: str) -> str:
+    """SQL text with whitespace, IN lists and inline numbers normalized"""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _PLACEHOLDER_LIST.sub("(?, ...)", shape)
+    return _NUMBER.sub("?", shape)
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.statements = []
+        self.count = 0
+        self.db_seconds = 0.0
+        self.explains = 0
+
+    def record(self, statement: str, seconds: float, plan=None):
+        self.count += 1
+        self.db_seconds += seconds
+        if len(self.statements) < QUERY_PROFILER_MAX_STATEMENTS:
+            self.statements.append((statement, seconds, plan))
+
+    def duplicates(self) -> list:
+        shapes = {}
+        for statement, seconds, _ in self.statements:
+            entry = shapes.setdefault(statement_shape(statement), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+        return sorted(
+            (
+                {"statement": shape, "count": count, "total_ms": round(seconds * 1000, 3)}
+                for shape, (count, seconds) in shapes.items()
+                if count >= QUERY_PROFILER_DUPLICATE_THRESHOLD
+            ),
+            key=lambda entry: -entry["count"],
+        )
+
+    def slow(self) -> list:
+        slow = [
+            {"statement": _WHITESPACE.sub(" ", statement).strip(), "duration_ms": round(seconds * 1000, 3), "plan": plan}
+            for statement, seconds, plan in self.statements
+            if seconds * 1000 >= QUERY_PROFILER_SLOW_MS
+        ]
+        return sorted(slow, key=lambda entry: -entry["duration_ms"])
+
+    def header(self) -> str:
+        duplicates = len(self.duplicates())
+        slow = sum(1 for _, seconds, _ in self.statements if seconds * 1000 >= QUERY_PROFILER_SLOW_MS)
+        return f"queries={self.count}; db_ms={self.db_seconds * 1000:.3f}; duplicates={duplicates}; slow={slow}"
+
+
+_current_profile: ContextVar = ContextVar("query_profile", default=None)
+_profiles = deque(maxlen=QUERY_PROFILER_HISTORY)
+_profile_ids = itertools.count(1)
+
+
+def recent_profiles(flagged_only: bool = False) -> list:
+    """Newest first"""
+    profiles = list(reversed(_profiles))
+    if flagged_only:
+        profiles = [profile for profile in profiles if profile["duplicates"] or profile["slow"]]
+    return profiles
+
+
+class ProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _current_profile.set(profile)
+        status_code = 500
+
+        async def send_with_profile(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Streaming bodies may run more statements after this point
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-profile", profile.header().encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _current_profile.reset(token)
+            _finish(profile, status_code, time.perf_counter() - started)
+
+
+def _finish(profile: RequestProfile, status_code: int, seconds: float):
+    if not profile.count:
+        return
+    report = {
+        "id": next(_profile_ids),
+        "method": profile.method,
+        "path": profile.path,
+        "status": status_code,
+        "duration_ms": round(seconds * 1000, 3),
+        "queries": profile.count,
+        "db_ms": round(profile.db_seconds * 1000, 3),
+        "duplicates": profile.duplicates(),
+        "slow": profile.slow(),
+    }
+    _profiles.append(report)
+    if report["duplicates"] or report["slow"]:
+        logger.warning(
+            "%s %s ran %d statements: %d repeated shapes, %d slow",
+            profile.method, profile.path, profile.count, len(report["duplicates"]), len(report["slow"]),
+        )
+
+
+def _explain(conn, statement: str, parameters):
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        prefix = "EXPLAIN "
+    elif dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        # A raw DBAPI cursor, so this does not come back through the events
+        cursor.execute(prefix + statement, parameters)
+        return [" ".join(str(value) for value in row) for row in cursor.fetchall()]
+    except Exception as exc:
+        return [f"EXPLAIN failed: {exc.__class__.__name__}"]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["profiler_started"].pop()
+    profile = _current_profile.get()
+    if profile is None:
+        return
+    plan = None
+    if (
+        QUERY_PROFILER_EXPLAIN
+        and not executemany
+        and seconds * 1000 >= QUERY_PROFILER_SLOW_MS
+        and profile.explains < QUERY_PROFILER_MAX_EXPLAINS
+        and statement.lstrip().upper().startswith(("SELECT", "WITH"))
+    ):
+        profile.explains += 1
+        plan = _explain(conn, statement, parameters)
+    profile.record(statement, seconds, plan)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("profiler_started"):
+        conn.info["profiler_started"].pop()
+
+
+def profile_engine(engine):
+    """Record statements run on a sync Engine against the current request"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
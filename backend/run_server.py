@@ -6,6 +6,8 @@ import sys
 import os
 
 if __name__ == "__main__":
+    # Development: create missing tables at startup instead of running migrate.py
+    os.environ.setdefault("SCHEMA_CHECK", "create")
     print("=" * 60)
     print("🚀 Starting FastAPI Backend Server")
     print("=" * 60)
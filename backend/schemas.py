@@ -0,0 +1,111 @@
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import List, Optional
+from datetime import datetime
+from decimal import Decimal
+
+# Pydantic models
+class MenuItemBase(BaseModel):
+    name: str
+    description: str
+    price: float
+    category: str
+    image: Optional[str] = None
+    popular: bool = False
+
+class MenuItemCreate(MenuItemBase):
+    pass
+
+class MenuItemResponse(MenuItemBase):
+    id: int
+    created_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True)
+
+# Batch edits: fields left out of a patch keep their current value
+MENU_BATCH_MAX_ITEMS = 1000
+
+class MenuItemPatch(BaseModel):
+    id: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    category: Optional[str] = None
+    image: Optional[str] = None
+    popular: Optional[bool] = None
+
+    @field_validator("name", "description", "price", "category", "popular")
+    @classmethod
+    def _not_null(cls, value):
+        # Leave a field out to keep it; only image may be cleared with null
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+class MenuBatchRequest(BaseModel):
+    update: List[MenuItemPatch] = Field(default_factory=list, max_length=MENU_BATCH_MAX_ITEMS)
+    delete: List[int] = Field(default_factory=list, max_length=MENU_BATCH_MAX_ITEMS)
+
+class MenuItemsLookupResponse(BaseModel):
+    items: List[MenuItemResponse]
+    missing: List[int]
+
+class MenuBatchResponse(BaseModel):
+    updated: List[MenuItemResponse]
+    deleted: List[int]
+
+# Delta sync: apply deleted, then items, and keep version for the next call
+class MenuChangesResponse(BaseModel):
+    version: int
+    reset: bool
+    items: List[MenuItemResponse]
+    deleted: List[int]
+
+# Cart pricing models; money is exact decimal, serialized as strings
+class CartLine(BaseModel):
+    item_id: int
+    quantity: int = Field(gt=0, le=1000)
+
+class CartQuoteRequest(BaseModel):
+    lines: List[CartLine] = Field(max_length=MENU_BATCH_MAX_ITEMS)
+
+class CartQuoteLine(BaseModel):
+    item_id: int
+    name: str
+    quantity: int
+    unit_price: Decimal
+    line_total: Decimal
+
+class CartQuoteResponse(BaseModel):
+    lines: List[CartQuoteLine]
+    subtotal: Decimal
+    item_count: int
+    missing: List[int]
+
+# Authentication Pydantic models
+class ClientRegister(BaseModel):
+    email: str
+    name: str
+
+class ClientRegisterResponse(BaseModel):
+    client_id: str
+    client_key: str
+    email: str
+    name: str
+    message: str
+
+class ClientLogin(BaseModel):
+    client_id: str
+    client_key: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str
+
+class ClientInfoResponse(BaseModel):
+    client_id: str
+    email: str
+    name: str
+    is_active: bool
+    created_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True)
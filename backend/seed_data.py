@@ -1,12 +1,12 @@
 # seed_data.py - Script to add initial menu items to the database
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-from models import Base, MenuItem
-
-# Create tables
-Base.metadata.create_all(bind=engine)
+from database import SessionLocal
+from migrate import bootstrap_schema
+from models import MenuItem
 
 def seed_menu_items():
+    # Create tables
+    bootstrap_schema()
     db = SessionLocal()
     
     try:
@@ -0,0 +1,51 @@
+"""
+Request coalescing for concurrent identical reads.
+
+When a burst of requests misses the cache together (a promo drops, an entry
+just expired), each would run the same query on its own connection. Calls
+made through SingleFlight.do with a key that is already in flight wait for
+that call and share its result, or its exception, instead. Callers include
+the menu cache version in the key, so a load that started before a write is
+never handed to a request that arrived after it. SingleFlight.start hands back
+the shared task itself, for callers that only wait on it for so long (the
+search index rebuild).
+"""
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        # key -> task of the call in flight; only touched from the event loop
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def start(self, key, fn) -> asyncio.Task:
+        """The task of the call in flight for key, starting fn() if there is none"""
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.shared += 1
+        return task
+
+    async def do(self, key, fn):
+        """Await fn(), or the call already in flight for key"""
+        # A caller that goes away must not cancel the load the others wait on
+        return await asyncio.shield(self.start(key, fn))
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller has gone
+            task.exception()
+
+    def snapshot(self) -> dict:
+        return {"in_flight": len(self._calls), "calls": self.calls, "shared": self.shared}
+
+
+read_flights = SingleFlight()
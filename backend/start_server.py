@@ -3,8 +3,11 @@
 Backend server startup script - keeps the server running
 """
 import uvicorn
+import os
 
 if __name__ == "__main__":
+    # Development: create missing tables at startup instead of running migrate.py
+    os.environ.setdefault("SCHEMA_CHECK", "create")
     print("🚀 Starting FastAPI server...")
     print("📍 Server will run on: http://localhost:8000")
     print("📖 API docs at: http://localhost:8000/docs")
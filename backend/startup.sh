@@ -1,2 +1,4 @@
 #!/bin/bash
-python -m uvicorn main:app --host 0.0.0.0 --port 8000
+# Bring the schema up to date, then start the workers (they do not touch it)
+python migrate.py || echo "⚠️  Schema migration failed; starting anyway"
+gunicorn -c gunicorn.conf.py main:app
@@ -0,0 +1,68 @@
+"""
+Startup warm-up, so a worker only reports ready once it can serve quickly.
+
+Left alone, the first requests after a deploy or cold start pay for opening
+database connections, compiling the first queries and loading the bcrypt
+backend. The lifespan runs the warm-up steps in a background task instead;
+/ready answers 503 until they have all finished, so the load balancer keeps
+real traffic on warm workers. A step that fails (the database is not up yet)
+is retried rather than crashing the worker.
+"""
+import asyncio
+import logging
+import os
+import time
+from database import DB_POOL_SIZE
+from metrics import startup_timings
+
+WARMUP = os.getenv("WARMUP", "true").lower() in ("1", "true", "yes")
+# Pool connections to open before reporting ready (capped at DB_POOL_SIZE)
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", str(DB_POOL_SIZE)))
+# Seconds between attempts at a step that failed
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "2"))
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class WarmupState:
+    def __init__(self):
+        # Without a warm-up there is nothing to wait for
+        self.ready = not WARMUP
+        self.steps = {}
+        self.error = None
+
+    def snapshot(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming up",
+            "steps_ms": {name: round(seconds * 1000, 1) for name, seconds in self.steps.items()},
+            "error": self.error,
+        }
+
+
+warmup_state = WarmupState()
+
+
+async def run_warmup(steps):
+    """Run each (name, coroutine function) step until it succeeds, then mark ready"""
+    started = time.perf_counter()
+    for name, step in steps:
+        while True:
+            step_started = time.perf_counter()
+            try:
+                await step()
+            except Exception as exc:
+                message = str(exc).strip()
+                warmup_state.error = f"{name}: {message.splitlines()[0] if message else type(exc).__name__}"
+                logger.warning("Warm-up failed, retrying in %gs: %s", WARMUP_RETRY_INTERVAL, warmup_state.error)
+                await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+                continue
+            warmup_state.steps[name] = time.perf_counter() - step_started
+            break
+    warmup_state.error = None
+    warmup_state.ready = True
+    startup_timings["warmup"] = time.perf_counter() - started
+    logger.info(
+        "Warm-up done in %.0f ms (%s)",
+        startup_timings["warmup"] * 1000,
+        ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in warmup_state.steps.items())
+    )